@@ -2,39 +2,136 @@
 """
 Simple HTTP server to serve the built static site
 """
+import argparse
+import io
 import os
+import signal
+import socket
 import sys
 from pathlib import Path
-from http.server import HTTPServer, SimpleHTTPRequestHandler
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
 import webbrowser
 
+try:
+    from endodoncia.common import CONTENT_TYPES
+except ImportError:
+    # Running from a checkout where the package isn't installed yet
+    sys.path.insert(0, str(Path(__file__).parent / "src"))
+    from endodoncia.common import CONTENT_TYPES
+
 class CustomHTTPRequestHandler(SimpleHTTPRequestHandler):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, directory=str(Path(__file__).parent / "dist"), **kwargs)
     
+    def guess_type(self, path):
+        """Look up the shared content-type table before the mimetypes registry"""
+        content_type = CONTENT_TYPES.get(os.path.splitext(path)[1].lower())
+        return content_type or super().guess_type(path)
+
+    def copyfile(self, source, outputfile):
+        """Send the file with os.sendfile, avoiding user-space copies"""
+        if not hasattr(os, 'sendfile'):
+            return super().copyfile(source, outputfile)
+        try:
+            in_fd = source.fileno()
+            out_fd = outputfile.fileno()
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            return super().copyfile(source, outputfile)
+
+        offset = source.tell()
+        remaining = os.fstat(in_fd).st_size - offset
+        while remaining > 0:
+            sent = os.sendfile(out_fd, in_fd, offset, remaining)
+            if sent == 0:
+                break
+            offset += sent
+            remaining -= sent
+
     def end_headers(self):
-        self.send_header('Cache-Control', 'no-cache, no-store, must-revalidate')
-        self.send_header('Pragma', 'no-cache')
-        self.send_header('Expires', '0')
+        # DEV_NO_CACHE=1 disables browser caching; otherwise cache as in production
+        if os.environ.get('DEV_NO_CACHE'):
+            self.send_header('Cache-Control', 'no-cache, no-store, must-revalidate')
+            self.send_header('Pragma', 'no-cache')
+            self.send_header('Expires', '0')
         super().end_headers()
 
-def serve_site(port=8000):
+class ReusableHTTPServer(ThreadingHTTPServer):
+    """Threaded server that rebinds immediately and can share its port"""
+    allow_reuse_address = True
+    reuse_port = False
+
+    def server_bind(self):
+        # SO_REUSEPORT lets several processes listen on the same port; the
+        # kernel then load-balances incoming connections between them
+        if self.reuse_port and hasattr(socket, 'SO_REUSEPORT'):
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+def make_server(port, reuse_port=False):
+    server = ReusableHTTPServer(('localhost', port), CustomHTTPRequestHandler,
+                                bind_and_activate=False)
+    server.reuse_port = reuse_port
+    try:
+        server.server_bind()
+        server.server_activate()
+    except BaseException:
+        server.server_close()
+        raise
+    return server
+
+def _exit_on_sigterm(signum, frame):
+    # Turn SIGTERM into an exception so serve_site's cleanup still runs
+    raise SystemExit(128 + signum)
+
+def fork_workers(server, port, count):
+    """Start `count` child processes serving the same port; return their pids"""
+    pids = []
+    for _ in range(count):
+        pid = os.fork()
+        if pid == 0:
+            # Child: the parent's SIGTERM handler must not apply here, and it
+            # listens on its own socket rather than the parent's
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            server.server_close()
+            status = 0
+            try:
+                make_server(port, reuse_port=True).serve_forever()
+            except KeyboardInterrupt:
+                pass
+            except BaseException as e:
+                print(f"❌ Worker {os.getpid()} failed: {e}", file=sys.stderr)
+                status = 1
+            finally:
+                os._exit(status)
+        pids.append(pid)
+    return pids
+
+def serve_site(port=8000, workers=1):
     """Serve the static site on localhost"""
     dist_dir = Path(__file__).parent / "dist"
     
     if not dist_dir.exists():
         print("❌ Error: dist directory not found. Run 'uv run build-site' first.")
         return
+    if workers > 1 and not (hasattr(os, 'fork') and hasattr(socket, 'SO_REUSEPORT')):
+        print("❌ --workers requires os.fork and SO_REUSEPORT, not available here")
+        return
     
     print(f"🚀 Starting server...")
     print(f"📁 Serving: {dist_dir}")
     print(f"🌐 URL: http://localhost:{port}")
+    if workers > 1:
+        print(f"👥 Workers: {workers}")
     print("📱 The site will open automatically in your browser")
     print("⏹️  Press Ctrl+C to stop the server")
     print("-" * 50)
     
+    children = []
+    # Installed before forking so no SIGTERM can slip in between
+    previous_sigterm = signal.signal(signal.SIGTERM, _exit_on_sigterm)
     try:
-        server = HTTPServer(('localhost', port), CustomHTTPRequestHandler)
+        server = make_server(port, reuse_port=workers > 1)
+        children = fork_workers(server, port, workers - 1)
         
         # Try to open the browser
         try:
@@ -45,20 +142,32 @@ def serve_site(port=8000):
         server.serve_forever()
     except KeyboardInterrupt:
         print("\n✅ Server stopped by user")
+    except SystemExit:
+        print("\n✅ Server stopped (SIGTERM)")
+        raise
     except OSError as e:
         if "Address already in use" in str(e):
             print(f"❌ Port {port} is already in use. Try a different port:")
-            print(f"   python serve.py {port + 1}")
+            print(f"   python serve.py --port {port + 1}")
         else:
             print(f"❌ Server error: {e}")
+    finally:
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+                os.waitpid(pid, 0)
+            except OSError:
+                pass
+        signal.signal(signal.SIGTERM, previous_sigterm)
 
 if __name__ == "__main__":
-    port = 8000
-    if len(sys.argv) > 1:
-        try:
-            port = int(sys.argv[1])
-        except ValueError:
-            print("❌ Invalid port number")
-            sys.exit(1)
+    parser = argparse.ArgumentParser(description="Serve the built static site")
+    parser.add_argument("--port", type=int, default=8000, help="port to listen on")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of server processes sharing the port")
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
     
-    serve_site(port)
\ No newline at end of file
+    serve_site(args.port, args.workers)
\ No newline at end of file
@@ -7,11 +7,24 @@ content translated to Spanish and fills in specialist details.
 
 from __future__ import annotations
 
+import argparse
+import hashlib
+import json
+import os
+import re
 import shutil
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict
+from types import MappingProxyType
+from typing import Any, Dict, Final, Iterator, Mapping, Optional, Set, Tuple
 
-from jinja2 import Environment, FileSystemLoader, select_autoescape
+from jinja2 import (
+    Environment,
+    FileSystemBytecodeCache,
+    FileSystemLoader,
+    TemplateNotFound,
+    select_autoescape,
+)
 
 
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
@@ -20,14 +33,27 @@ PACKAGE_DIR = SRC_DIR / "endodoncia"
 TEMPLATES_DIR = PACKAGE_DIR / "templates"
 ASSETS_DIR = PACKAGE_DIR / "assets"
 DIST_DIR = PROJECT_ROOT / "dist"
+JINJA_CACHE_DIR = PROJECT_ROOT / ".jinja_cache"
+# Kept outside dist/ so it is neither deployed nor committed with the output.
+BUILD_MANIFEST_PATH = PROJECT_ROOT / ".build_manifest.json"
 
 
-def get_site_context() -> Dict[str, str]:
-    """Return the site context to inject into templates.
+# Template to URL mapping
+TEMPLATES: Final[Tuple[Tuple[str, str], ...]] = (
+    ("index.html", "index.html"),
+    ("root-canal.html", "root-canal-treatment/index.html"),
+    ("root-canal-retreatment.html", "root-canal-retreatment/index.html"),
+    ("endodontic-microsurgery.html", "endodontic-microsurgery/index.html"),
+    ("dental-trauma.html", "dental-trauma/index.html"),
+    ("internal-bleaching.html", "internal-bleaching/index.html"),
+    ("contact-form.html", "contacto/index.html"),
+)
 
-    All strings are Spanish translations or localized variants.
-    """
-    return {
+
+# Built once at import and shared read-only by every render (and inherited by
+# worker processes), so templates cannot mutate it between pages.
+_SITE_CONTEXT: Final[Mapping[str, Any]] = MappingProxyType(
+    {
         "site_phone": "+56 9 4160 3277",
         "site_phone_link": "tel:+56941603277",
         "site_address": "Av. Las Condes 10465 oficina 116, Las Condes",
@@ -40,13 +66,16 @@ def get_site_context() -> Dict[str, str]:
         "menu_about": "Sobre Nosotros",
         "menu_services": "Servicios",
         "menu_contact": "Contacto",
-        "services": [
-            {"title": "Tratamiento de Conductos", "slug": "root-canal-treatment"},
-            {"title": "Retratamiento de Conductos", "slug": "root-canal-retreatment"},
-            {"title": "Microcirugía Endodóntica", "slug": "endodontic-microsurgery"},
-            {"title": "Trauma Dental", "slug": "dental-trauma"},
-            {"title": "Blanqueamiento Interno", "slug": "internal-bleaching"},
-        ],
+        "services": tuple(
+            MappingProxyType(service)
+            for service in (
+                {"title": "Tratamiento de Conductos", "slug": "root-canal-treatment"},
+                {"title": "Retratamiento de Conductos", "slug": "root-canal-retreatment"},
+                {"title": "Microcirugía Endodóntica", "slug": "endodontic-microsurgery"},
+                {"title": "Trauma Dental", "slug": "dental-trauma"},
+                {"title": "Blanqueamiento Interno", "slug": "internal-bleaching"},
+            )
+        ),
         # Specialist info (placeholder - update if verified)
         "specialist_name": "Andrés Morales Jalilie",
         "specialist_title": "Endodoncista",
@@ -55,53 +84,279 @@ def get_site_context() -> Dict[str, str]:
             " técnicas microquirúrgicas y el uso de microscopio operatorio."
         ),
     }
+)
+
+
+def get_site_context() -> Mapping[str, Any]:
+    """Return the site context to inject into templates.
+
+    All strings are Spanish translations or localized variants.
+    """
+    return _SITE_CONTEXT
 
 
 def clean_dist() -> None:
     if DIST_DIR.exists():
         shutil.rmtree(DIST_DIR)
+    BUILD_MANIFEST_PATH.unlink(missing_ok=True)
     DIST_DIR.mkdir(parents=True, exist_ok=True)
 
 
+def _reflink_or_copy(src: Path, dst: Path) -> None:
+    """Copy a file in the kernel when possible, preserving its metadata.
+
+    ``os.copy_file_range`` lets reflink-capable filesystems (btrfs, XFS)
+    share extents instead of duplicating bytes; elsewhere it still avoids
+    copying through user space.
+    """
+    try:
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            remaining = os.fstat(fsrc.fileno()).st_size
+            while remaining > 0:
+                copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                if copied == 0:
+                    break
+                remaining -= copied
+        if remaining > 0:
+            raise OSError("copy_file_range stopped early")
+        shutil.copystat(src, dst)
+    except (AttributeError, OSError):
+        shutil.copy2(src, dst)
+
+
 def copy_assets() -> None:
-    if ASSETS_DIR.exists():
-        shutil.copytree(ASSETS_DIR, DIST_DIR / "assets")
+    """Sync assets into dist/, copying only files whose size or mtime changed."""
+    if not ASSETS_DIR.exists():
+        return
+    dest_root = DIST_DIR / "assets"
+    seen = set()
+    pending = []
+    for src in ASSETS_DIR.rglob("*"):
+        if src.is_dir():
+            continue
+        rel = src.relative_to(ASSETS_DIR)
+        seen.add(rel)
+        dst = dest_root / rel
+        src_stat = src.stat()
+        if dst.exists():
+            dst_stat = dst.stat()
+            if (
+                dst_stat.st_size == src_stat.st_size
+                and dst_stat.st_mtime >= src_stat.st_mtime
+            ):
+                continue
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        pending.append((src, dst))
 
+    # Directories exist already, so copies can overlap freely.
+    if pending:
+        with ThreadPoolExecutor(max_workers=min(8, len(pending))) as executor:
+            list(executor.map(lambda pair: _reflink_or_copy(*pair), pending))
 
-def render_templates() -> None:
-    env = Environment(
+    # Drop assets that no longer exist in the source tree.
+    if dest_root.exists():
+        for dst in dest_root.rglob("*"):
+            if dst.is_file() and dst.relative_to(dest_root) not in seen:
+                dst.unlink()
+
+
+def _create_environment() -> Environment:
+    # Compiled templates are kept on disk so rebuilds skip parsing/compiling.
+    # The directory is created by _prepare_cache() when rendering starts, so
+    # importing this module (e.g. from deploy.py) never writes to disk.
+    return Environment(
         loader=FileSystemLoader(str(TEMPLATES_DIR)),
         autoescape=select_autoescape(["html", "xml"]),
+        bytecode_cache=FileSystemBytecodeCache(directory=str(JINJA_CACHE_DIR)),
     )
+
+
+_ENV = _create_environment()
+
+
+def _prepare_cache() -> None:
+    # Called before workers start, so they never race on mkdir.
+    JINJA_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+
+
+# {# comments #} and {% raw %} blocks are not template code, so references
+# inside them are dropped before scanning.
+_IGNORED_SPANS_RE = re.compile(
+    r"{#.*?#}|{%[-+]?\s*raw\s*[-+]?%}.*?{%[-+]?\s*endraw\s*[-+]?%}", re.S
+)
+# {% extends/include/import/from ... %} tags. Scanning the source avoids a full
+# Jinja parse, which bypasses the bytecode cache.
+_TEMPLATE_TAG_RE = re.compile(
+    r"{%[-+]?\s*(?:extends|include|import|from)\s(.*?)[-+]?%}", re.S
+)
+# A tag whose target is a single string literal, plus the modifiers Jinja
+# allows after it. Anything else (variables, ``~`` concatenation, lists) is
+# only known at render time.
+_STATIC_REF_RE = re.compile(
+    r"""\s*(["'])([^"']+)\1"""
+    r"(?:\s+(?:ignore\s+missing|with(?:out)?\s+context|as\s+\w+|import\b.*))*\s*",
+    re.S,
+)
+
+
+def _template_source(template_name: str, sources: Dict[str, str]) -> str:
+    """Return a template's source through the loader, or "" if it is missing.
+
+    A missing template is only an error when Jinja renders it (and not at all
+    for ``ignore missing``), so it simply contributes nothing to the digest.
+    """
+    if template_name not in sources:
+        try:
+            sources[template_name] = _ENV.loader.get_source(_ENV, template_name)[0]
+        except TemplateNotFound:
+            sources[template_name] = ""
+    return sources[template_name]
+
+
+def _template_sources(
+    template_name: str, sources: Dict[str, str], seen: Set[str]
+) -> Optional[str]:
+    """Return the source of a template and every template it references.
+
+    ``sources`` caches template contents so each is read once per build.
+    Returns None if any reference is dynamic, as its target cannot be known
+    without rendering.
+    """
+    if template_name in seen:
+        return ""
+    seen.add(template_name)
+    source = _template_source(template_name, sources)
+    refs = set()
+    for tag in _TEMPLATE_TAG_RE.findall(_IGNORED_SPANS_RE.sub("", source)):
+        match = _STATIC_REF_RE.fullmatch(tag)
+        if match is None:
+            return None
+        refs.add(match.group(2))
+    parts = [source]
+    for ref in sorted(refs):
+        ref_sources = _template_sources(ref, sources, seen)
+        if ref_sources is None:
+            return None
+        parts.append(ref_sources)
+    return "".join(parts)
+
+
+def _template_digest(
+    template_name: str, context_json: bytes, sources: Dict[str, str]
+) -> Optional[str]:
+    """Return a digest of a page's inputs, or None if it must always render."""
+    template_sources = _template_sources(template_name, sources, set())
+    if template_sources is None:
+        return None
+    return hashlib.sha256(template_sources.encode("utf-8") + context_json).hexdigest()
+
+
+def _load_manifest() -> Dict[str, str]:
+    try:
+        return json.loads(BUILD_MANIFEST_PATH.read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def render_templates() -> None:
+    """Render templates whose sources or context changed since the last build.
+
+    Stale pages are rendered in worker processes, so call this while no other
+    threads are running.
+    """
     context = get_site_context()
+    manifest = _load_manifest()
+    # MappingProxyType is not JSON-serializable on its own.
+    context_json = json.dumps(context, sort_keys=True, default=dict).encode("utf-8")
+    sources: Dict[str, str] = {}
+    stale = []
+    for template_name, output_path in TEMPLATES:
+        digest = _template_digest(template_name, context_json, sources)
+        if digest is None:
+            # Dynamic references: there is no digest that proves it is fresh.
+            manifest.pop(output_path, None)
+        elif (
+            manifest.get(output_path) == digest and (DIST_DIR / output_path).exists()
+        ):
+            continue
+        else:
+            manifest[output_path] = digest
+        stale.append((template_name, output_path))
+
+    if not stale:
+        return
 
-    # Template to URL mapping
-    templates = [
-        ("index.html", "index.html"),
-        ("root-canal.html", "root-canal-treatment/index.html"),
-        ("root-canal-retreatment.html", "root-canal-retreatment/index.html"),
-        ("endodontic-microsurgery.html", "endodontic-microsurgery/index.html"),
-        ("dental-trauma.html", "dental-trauma/index.html"),
-        ("internal-bleaching.html", "internal-bleaching/index.html"),
-        ("contact-form.html", "contacto/index.html"),
-    ]
-
-    for template_name, output_path in templates:
-        template = env.get_template(template_name)
-        html = template.render(**context)
-        out_path = DIST_DIR / output_path
-        out_path.parent.mkdir(parents=True, exist_ok=True)
-        out_path.write_text(html, encoding="utf-8")
-
-
-def build() -> None:
-    clean_dist()
+    # Create output directories up front so workers never race on mkdir.
+    _prepare_cache()
+    for _, output_path in stale:
+        (DIST_DIR / output_path).parent.mkdir(parents=True, exist_ok=True)
+
+    # Rendering is pure-Python work, so separate processes avoid the GIL.
+    template_names, output_paths = zip(*stale)
+    workers = min(os.cpu_count() or 1, len(stale))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(_render_one, template_names, output_paths))
+
+    BUILD_MANIFEST_PATH.write_text(
+        json.dumps(manifest, indent=2, sort_keys=True), encoding="utf-8"
+    )
+
+
+def _render_one(template_name: str, output_path: str) -> None:
+    # Runs in a worker process; _ENV and the site context are module-level, so
+    # workers get them from the module instead of having them pickled per task.
+    template = _ENV.get_template(template_name)
+    # Stream chunks to disk instead of building the whole page in memory.
+    template.stream(**get_site_context()).dump(
+        str(DIST_DIR / output_path), encoding="utf-8"
+    )
+
+
+def _render_page(template_name: str) -> bytes:
+    template = _ENV.get_template(template_name)
+    return template.render(**get_site_context()).encode("utf-8")
+
+
+def render_pages() -> Iterator[Tuple[str, bytes]]:
+    """Render every page in memory, yielding ``(output_path, html)`` pairs.
+
+    Used when deploying straight from the templates, where writing dist/
+    first would only be read back again. Rendering runs in worker processes,
+    so consume the iterator before starting any threads.
+    """
+    _prepare_cache()
+    template_names, output_paths = zip(*TEMPLATES)
+    workers = min(os.cpu_count() or 1, len(TEMPLATES))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from zip(output_paths, executor.map(_render_page, template_names))
+
+
+def build(clean: bool = False) -> None:
+    """Build the site into dist/, reusing unchanged output unless ``clean``."""
+    if clean:
+        clean_dist()
+    else:
+        DIST_DIR.mkdir(parents=True, exist_ok=True)
+    # copy_assets() uses threads and render_templates() forks worker processes;
+    # forking while other threads run can deadlock, so they run one after the
+    # other, with the copy threads finished first.
     copy_assets()
     render_templates()
     print(f"Build complete: {DIST_DIR}")
 
 
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build the static site into dist/")
+    parser.add_argument(
+        "--clean",
+        action="store_true",
+        help="remove dist/ and re-render everything from scratch",
+    )
+    args = parser.parse_args()
+    build(clean=args.clean)
+
+
 if __name__ == "__main__":
-    build()
+    main()
 
 
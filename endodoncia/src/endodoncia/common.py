@@ -0,0 +1,39 @@
+"""Constants shared by the build, deploy and local-serve tools."""
+
+from __future__ import annotations
+
+import mimetypes
+from types import MappingProxyType
+from typing import Dict, Mapping
+
+# Types used by this site, set explicitly so they don't depend on the host's
+# mime.types (and text types carry a charset).
+_SITE_CONTENT_TYPES: Dict[str, str] = {
+    ".html": "text/html; charset=utf-8",
+    ".css": "text/css; charset=utf-8",
+    ".js": "application/javascript; charset=utf-8",
+    ".svg": "image/svg+xml",
+    ".json": "application/json",
+    ".woff": "font/woff",
+    ".woff2": "font/woff2",
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".webp": "image/webp",
+    ".ico": "image/x-icon",
+    ".mp4": "video/mp4",
+    ".pdf": "application/pdf",
+}
+
+
+def _build_content_types() -> Mapping[str, str]:
+    mimetypes.init()
+    table = {ext.lower(): ctype for ext, ctype in mimetypes.types_map.items()}
+    table.update(_SITE_CONTENT_TYPES)
+    return MappingProxyType(table)
+
+
+# Resolved once at import from the mimetypes registry plus the entries above:
+# a dict lookup replaces per-request registry calls and avoids
+# application/octet-stream fallbacks, which CloudFront won't compress.
+CONTENT_TYPES: Mapping[str, str] = _build_content_types()
@@ -1,52 +1,597 @@
+import argparse
+import gzip
+import hashlib
 import os
+import re
+import sys
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 import boto3
+from boto3.exceptions import S3UploadFailedError
+from boto3.s3.transfer import S3Transfer, TransferConfig
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
+from endodoncia.build import ASSETS_DIR, render_pages
+from endodoncia.common import CONTENT_TYPES
+
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
 DIST_DIR = PROJECT_ROOT / "dist"
 
+# Uploads are network-bound; the HTTP pool is sized at twice the worker count
+# so threads never wait on a free connection.
+UPLOAD_WORKERS = 16
+
+# Small files go through the outer thread pool as single PUTs; anything above
+# the threshold is split into parts uploaded concurrently by s3transfer.
+MULTIPART_THRESHOLD = 8 * 1024 * 1024
+
+
+def _transfer_config(max_workers: int) -> TransferConfig:
+    """Return the s3transfer settings for a deploy running ``max_workers``."""
+    return TransferConfig(
+        multipart_threshold=MULTIPART_THRESHOLD,
+        multipart_chunksize=MULTIPART_THRESHOLD,
+        max_concurrency=max_workers,
+    )
+
+
+# Very large files are uploaded part by part with a sliding window: a new part
+# starts as soon as any in-flight part finishes, so one slow part never stalls
+# the others.
+LARGE_FILE_THRESHOLD = 100 * 1024 * 1024
+LARGE_FILE_PART_SIZE = 16 * 1024 * 1024
+LARGE_FILE_WORKERS = 8
+MAX_PARTS = 10000
+
+
+def _large_part_window(max_workers: int) -> int:
+    """Return how many large-file parts a deploy running ``max_workers`` uploads.
+
+    Each in-flight part is held in memory, so the window is shared by all large
+    files of a deploy, whatever the number of files uploading in parallel.
+    """
+    return min(LARGE_FILE_WORKERS, max_workers)
+
+# Largest object CopyObject can copy in one request.
+COPY_OBJECT_LIMIT = 5 * 1024 * 1024 * 1024
+
+# Text formats are stored gzip-encoded; S3 cannot pick between encodings per
+# request, and every browser accepts gzip.
+COMPRESSIBLE_SUFFIXES = frozenset({".html", ".css", ".js", ".svg", ".json"})
+
+# Fingerprinted files (e.g. app.3f9a1c2b.js) never change under the same name.
+HASHED_ASSET_RE = re.compile(r"\.[0-9a-f]{8,}\.")
+CACHE_IMMUTABLE = "public, max-age=31536000, immutable"
+CACHE_REVALIDATE = "public, max-age=0, must-revalidate"
+# Unhashed assets keep their name across deploys: the CDN holds them until the
+# next invalidation, browsers re-check daily.
+CACHE_ASSET = "public, max-age=86400, s-maxage=31536000"
+
+# What happened to each object; None means it was already up to date.
+UPLOADED = "uploaded"
+COPIED = "copied"
+UPDATED = "metadata updated"
+
+# CloudFront accepts at most 3000 paths per invalidation; beyond that a
+# wildcard is both allowed and cheaper.
+MAX_INVALIDATION_PATHS = 3000
+
+
+def list_remote_objects(
+    s3, bucket_name: str, prefix: str = ""
+) -> Dict[str, Tuple[int, str]]:
+    """Return ``{key: (size, etag)}`` for every object under ``prefix``."""
+    existing = {}
+    try:
+        paginator = s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                existing[obj["Key"]] = (obj["Size"], obj["ETag"].strip('"'))
+    except ClientError as e:
+        raise RuntimeError(f"Failed to list s3://{bucket_name}/{prefix}: {e}")
+    return existing
+
+
+def cache_control_for(rel: str) -> str:
+    """Return the Cache-Control header for a dist-relative path."""
+    if HASHED_ASSET_RE.search(rel):
+        return CACHE_IMMUTABLE
+    if rel.endswith(".html"):
+        return CACHE_REVALIDATE
+    return CACHE_ASSET
+
+
+def _upload_part_size(size: int) -> Optional[int]:
+    """Return the part size used to upload ``size`` bytes, or None for one PUT.
+
+    Mirrors what S3Transfer (below LARGE_FILE_THRESHOLD) and
+    _multipart_upload (above it) do, so multipart ETags can be predicted.
+    """
+    if size < MULTIPART_THRESHOLD:
+        return None
+    if size > LARGE_FILE_THRESHOLD:
+        return max(LARGE_FILE_PART_SIZE, -(-size // MAX_PARTS))
+    return MULTIPART_THRESHOLD
+
+
+def _read_part(path: str, offset: int, length: int) -> bytes:
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return f.read(length)
+
+
+def _upload_part(
+    s3,
+    path: str,
+    bucket_name: str,
+    key: str,
+    upload_id: str,
+    number: int,
+    offset: int,
+    length: int,
+    part_slots: threading.BoundedSemaphore,
+) -> Dict[str, object]:
+    # The caller acquired a slot in part_slots for this part.
+    try:
+        resp = s3.upload_part(
+            Bucket=bucket_name,
+            Key=key,
+            UploadId=upload_id,
+            PartNumber=number,
+            Body=_read_part(path, offset, length),
+        )
+    finally:
+        part_slots.release()
+    return {"PartNumber": number, "ETag": resp["ETag"]}
+
+
+def _multipart_upload(
+    s3,
+    path: str,
+    bucket_name: str,
+    key: str,
+    extra_args: Dict[str, str],
+    part_slots: threading.BoundedSemaphore,
+    window: int,
+) -> None:
+    """Upload a large file keeping up to ``window`` parts in flight.
+
+    ``part_slots`` is shared by every large file of the deploy and holds
+    ``window`` slots, one per part in flight.
+    """
+    size = os.stat(path).st_size
+    part_size = _upload_part_size(size)
+    ranges = [
+        (number, offset, min(part_size, size - offset))
+        for number, offset in enumerate(range(0, size, part_size), start=1)
+    ]
+
+    resp = s3.create_multipart_upload(Bucket=bucket_name, Key=key, **extra_args)
+    upload_id = resp["UploadId"]
+    parts = []
+    try:
+        with ThreadPoolExecutor(max_workers=window) as executor:
+            pending = set()
+            for number, offset, length in ranges:
+                if len(pending) >= window:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    parts.extend(f.result() for f in done)
+                part_slots.acquire()
+                try:
+                    future = executor.submit(
+                        _upload_part,
+                        s3,
+                        path,
+                        bucket_name,
+                        key,
+                        upload_id,
+                        number,
+                        offset,
+                        length,
+                        part_slots,
+                    )
+                except BaseException:
+                    part_slots.release()
+                    raise
+                pending.add(future)
+            parts.extend(f.result() for f in wait(pending).done)
+        parts.sort(key=lambda part: part["PartNumber"])
+        s3.complete_multipart_upload(
+            Bucket=bucket_name,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={"Parts": parts},
+        )
+    except BaseException:
+        s3.abort_multipart_upload(Bucket=bucket_name, Key=key, UploadId=upload_id)
+        raise
+
+
+def _copy_object(
+    s3,
+    bucket_name: str,
+    source_key: str,
+    key: str,
+    extra_args: Dict[str, str],
+    size: int,
+) -> None:
+    """Server-side copy within the bucket, replacing metadata with ours.
+
+    Objects over the CopyObject limit are copied with UploadPartCopy, using
+    the same part size as an upload so the resulting ETag stays predictable.
+    """
+    copy_source = {"Bucket": bucket_name, "Key": source_key}
+    args = {"MetadataDirective": "REPLACE", **extra_args}
+    if size <= COPY_OBJECT_LIMIT:
+        s3.copy_object(Bucket=bucket_name, Key=key, CopySource=copy_source, **args)
+        return
+    config = TransferConfig(
+        multipart_threshold=COPY_OBJECT_LIMIT,
+        multipart_chunksize=_upload_part_size(size),
+    )
+    s3.copy(copy_source, bucket_name, key, ExtraArgs=args, Config=config)
+
+
+def _metadata_matches(
+    s3, bucket_name: str, key: str, extra_args: Dict[str, str]
+) -> bool:
+    """True if the stored object already carries the headers we would set.
+
+    Listing only reports size and ETag, so objects whose bytes are unchanged
+    are checked with a HEAD; otherwise new Cache-Control or Content-Type
+    values would never reach them.
+    """
+    head = s3.head_object(Bucket=bucket_name, Key=key)
+    for name in ("ContentType", "CacheControl"):
+        if name in extra_args and head.get(name) != extra_args[name]:
+            return False
+    return head.get("ContentEncoding") == extra_args.get("ContentEncoding")
+
+
+def _skip_or_refresh(
+    s3, bucket_name: str, key: str, extra_args: Dict[str, str], size: int
+) -> Optional[str]:
+    """Handle an object whose content is already up to date.
+
+    Rewrites its metadata in place when it is stale (returning ``UPDATED``),
+    or returns None when nothing had to be done.
+    """
+    if _metadata_matches(s3, bucket_name, key, extra_args):
+        return None
+    _copy_object(s3, bucket_name, key, key, extra_args, size)
+    return UPDATED
+
+
+def _put_if_changed(
+    s3,
+    body: bytes,
+    bucket_name: str,
+    key: str,
+    extra_args: Dict[str, str],
+    remote: Optional[Tuple[int, str]],
+    previous: Optional[Tuple[str, Tuple[int, str]]] = None,
+) -> Optional[str]:
+    """PUT an in-memory body unless the remote object already matches it.
+
+    Compressible keys are gzipped first and compared/stored as such. A
+    matching object with outdated headers has its metadata replaced. If
+    ``previous`` (``(old_key, (size, etag))``) holds the same content, it is
+    copied server-side instead of uploaded. Returns what was done (UPLOADED,
+    COPIED or UPDATED), or None if the object was already up to date.
+    """
+    if os.path.splitext(key)[1].lower() in COMPRESSIBLE_SUFFIXES:
+        # mtime=0 keeps the output byte-identical across builds.
+        body = gzip.compress(body, compresslevel=9, mtime=0)
+        extra_args = {**extra_args, "ContentEncoding": "gzip"}
+    fingerprint = (len(body), hashlib.md5(body).hexdigest())
+    if remote == fingerprint:
+        return _skip_or_refresh(s3, bucket_name, key, extra_args, len(body))
+    if previous is not None and previous[1] == fingerprint:
+        _copy_object(s3, bucket_name, previous[0], key, extra_args, len(body))
+        return COPIED
+    s3.put_object(Bucket=bucket_name, Key=key, Body=body, **extra_args)
+    return UPLOADED
+
+
+class FileMeta:
+    """A local file to deploy, with its ETags computed only when first needed."""
+
+    __slots__ = ("rel", "path", "size", "_etags")
+
+    def __init__(self, rel: str, path: str, size: int) -> None:
+        self.rel = rel
+        self.path = path
+        self.size = size
+        self._etags: Optional[Tuple[str, ...]] = None
+
+    @property
+    def etags(self) -> Tuple[str, ...]:
+        """ETags S3 may report for this content.
+
+        Always includes the plain MD5 (single PUT or CopyObject). Files large
+        enough to be uploaded in parts also include the multipart ETag: the
+        MD5 of the concatenated part MD5s, suffixed with ``-<parts>``.
+        """
+        if self._etags is None:
+            part_size = _upload_part_size(self.size)
+            whole = hashlib.md5()
+            part_digests = []
+            with open(self.path, "rb") as f:
+                for chunk in iter(lambda: f.read(part_size or 1024 * 1024), b""):
+                    whole.update(chunk)
+                    if part_size:
+                        part_digests.append(hashlib.md5(chunk).digest())
+            etags = (whole.hexdigest(),)
+            if part_digests:
+                multipart = hashlib.md5(b"".join(part_digests)).hexdigest()
+                etags += (f"{multipart}-{len(part_digests)}",)
+            self._etags = etags
+        return self._etags
+
+    def matches(self, remote: Optional[Tuple[int, str]]) -> bool:
+        """True if ``remote`` (``(size, etag)``) holds this file's content."""
+        # The size check comes first so files that obviously changed are never hashed.
+        return (
+            remote is not None and remote[0] == self.size and remote[1] in self.etags
+        )
+
+
+def _walk_files(root: str, dist_prefix: str = "") -> Iterator[FileMeta]:
+    """Yield every file under ``root`` in a single ``os.scandir`` pass.
+
+    ``dist_prefix`` is where ``root`` lives inside dist/ (e.g. ``"assets/"``),
+    so ``FileMeta.rel`` is always relative to dist/.
+    """
+    with os.scandir(root) as entries:
+        for entry in entries:
+            rel = f"{dist_prefix}{entry.name}"
+            if entry.is_dir():
+                yield from _walk_files(entry.path, f"{rel}/")
+            elif entry.is_file():
+                yield FileMeta(rel, entry.path, entry.stat().st_size)
+
+
+def _upload_if_changed(
+    s3,
+    transfer: S3Transfer,
+    part_slots: threading.BoundedSemaphore,
+    window: int,
+    meta: FileMeta,
+    bucket_name: str,
+    key: str,
+    extra_args: Dict[str, str],
+    remote: Optional[Tuple[int, str]],
+    previous: Optional[Tuple[str, Tuple[int, str]]] = None,
+) -> Optional[str]:
+    """Upload a local file unless the remote object already has the same content.
+
+    Compressible files are gzipped in memory and compared/uploaded as such.
+    A matching object with outdated headers has its metadata replaced, and a
+    matching ``previous`` object is copied server-side instead. Returns the
+    same outcomes as ``_put_if_changed``.
+    """
+    if os.path.splitext(meta.rel)[1].lower() in COMPRESSIBLE_SUFFIXES:
+        with open(meta.path, "rb") as f:
+            body = f.read()
+        return _put_if_changed(
+            s3, body, bucket_name, key, extra_args, remote, previous
+        )
+
+    if meta.matches(remote):
+        return _skip_or_refresh(s3, bucket_name, key, extra_args, meta.size)
+    if previous is not None and meta.matches(previous[1]):
+        _copy_object(s3, bucket_name, previous[0], key, extra_args, meta.size)
+        return COPIED
+    if meta.size > LARGE_FILE_THRESHOLD:
+        _multipart_upload(
+            s3, meta.path, bucket_name, key, extra_args, part_slots, window
+        )
+    else:
+        transfer.upload_file(meta.path, bucket_name, key, extra_args=extra_args)
+    return UPLOADED
+
 
-def upload_directory_to_s3(bucket_name: str, prefix: str = "") -> None:
+def _extra_args_for(rel: str) -> Dict[str, str]:
+    """Return the S3 object metadata for a dist-relative path."""
+    extra_args = {"CacheControl": cache_control_for(rel)}
+    content_type = CONTENT_TYPES.get(os.path.splitext(rel)[1].lower())
+    if content_type:
+        extra_args["ContentType"] = content_type
+    return extra_args
+
+
+def _upload_all(
+    bucket_name: str,
+    prefix: str,
+    files: Iterable[FileMeta],
+    pages: Iterable[Tuple[str, bytes]],
+    max_workers: int,
+    old_prefix: Optional[str] = None,
+) -> List[str]:
+    """Upload local files and in-memory pages, skipping unchanged objects.
+
+    Both ``files`` and ``pages`` are keyed by their path relative to dist/;
+    either may be a lazy iterator, consumed as uploads are submitted. Objects
+    already present under ``old_prefix`` are copied server-side.
+    Returns the keys that were uploaded, copied or had their metadata updated.
+    """
+    window = _large_part_window(max_workers)
+    part_slots = threading.BoundedSemaphore(window)
+    # Direct calls from the executor, s3transfer's own threads and the parts
+    # of large files all share this client's connection pool.
+    s3 = boto3.client(
+        "s3", config=Config(max_pool_connections=2 * max_workers + window)
+    )
+    existing = list_remote_objects(s3, bucket_name, prefix)
+    old_existing = {}
+    if old_prefix is not None and old_prefix != prefix:
+        old_existing = list_remote_objects(s3, bucket_name, old_prefix)
+
+    def previous(rel: str) -> Optional[Tuple[str, Tuple[int, str]]]:
+        if not old_existing:
+            return None
+        old_key = f"{old_prefix}{rel}"
+        if old_key in old_existing:
+            return old_key, old_existing[old_key]
+        return None
+
+    changed = []
+    outcomes: Dict[str, int] = {}
+    config = _transfer_config(max_workers)
+    with S3Transfer(s3, config) as transfer, ThreadPoolExecutor(
+        max_workers=max_workers
+    ) as executor:
+        futures = {}
+        for meta in files:
+            key = f"{prefix}{meta.rel}"
+            future = executor.submit(
+                _upload_if_changed,
+                s3,
+                transfer,
+                part_slots,
+                window,
+                meta,
+                bucket_name,
+                key,
+                _extra_args_for(meta.rel),
+                existing.get(key),
+                previous(meta.rel),
+            )
+            futures[future] = (meta.path, key)
+        for rel, body in pages:
+            key = f"{prefix}{rel}"
+            future = executor.submit(
+                _put_if_changed,
+                s3,
+                body,
+                bucket_name,
+                key,
+                _extra_args_for(rel),
+                existing.get(key),
+                previous(rel),
+            )
+            futures[future] = (rel, key)
+        # Results are reported from this thread only, as a single progress line
+        # rather than one print per file.
+        total = len(futures)
+        show_progress = sys.stdout.isatty()
+        for done, future in enumerate(as_completed(futures), start=1):
+            source, key = futures[future]
+            try:
+                outcome = future.result()
+            except (ClientError, S3UploadFailedError) as e:
+                raise RuntimeError(f"Failed to upload {source} -> {key}: {e}")
+            if outcome is not None:
+                changed.append(key)
+                outcomes[outcome] = outcomes.get(outcome, 0) + 1
+            if show_progress:
+                print(f"\r{done}/{total} files", end="", flush=True)
+        if show_progress:
+            print()
+    summary = ", ".join(
+        f"{outcomes.get(outcome, 0)} {outcome}"
+        for outcome in (UPLOADED, COPIED, UPDATED)
+    )
+    print(
+        f"Deployed {total} files to s3://{bucket_name}/{prefix}: {summary},"
+        f" {total - len(changed)} unchanged"
+    )
+    return changed
+
+
+def upload_directory_to_s3(
+    bucket_name: str,
+    prefix: str = "",
+    max_workers: int = UPLOAD_WORKERS,
+    old_prefix: Optional[str] = None,
+) -> List[str]:
     """Upload the dist directory to the given S3 bucket.
 
+    Files whose size and MD5 match the object already stored under the same
+    key are skipped; files matching the object under ``old_prefix`` are
+    copied within S3 instead of uploaded again.
+
     Args:
         bucket_name: Target S3 bucket name
         prefix: Optional prefix within the bucket (e.g., "site/")
+        max_workers: Number of uploads kept in flight at once
+        old_prefix: Prefix of a previous deploy to copy unchanged files from
+
+    Returns:
+        The keys that were uploaded, copied or had their metadata updated.
     """
-    s3 = boto3.client("s3")
-
-    for path in DIST_DIR.rglob("*"):
-        if path.is_dir():
-            continue
-        rel = path.relative_to(DIST_DIR)
-        key = f"{prefix}{rel.as_posix()}" if prefix else rel.as_posix()
-        extra_args = {}
-        if path.suffix == ".html":
-            extra_args["ContentType"] = "text/html; charset=utf-8"
-        elif path.suffix == ".css":
-            extra_args["ContentType"] = "text/css; charset=utf-8"
-        elif path.suffix == ".js":
-            extra_args["ContentType"] = "application/javascript; charset=utf-8"
-        try:
-            s3.upload_file(str(path), bucket_name, key, ExtraArgs=extra_args)
-            print(f"Uploaded s3://{bucket_name}/{key}")
-        except ClientError as e:
-            raise RuntimeError(f"Failed to upload {path} -> {key}: {e}")
-
-
-def invalidate_cloudfront(distribution_id: Optional[str]) -> None:
-    """Create an invalidation for the entire distribution if an ID is provided."""
-    if not distribution_id:
+    files = _walk_files(str(DIST_DIR))
+    return _upload_all(bucket_name, prefix, files, (), max_workers, old_prefix)
+
+
+def build_and_deploy(
+    bucket_name: str,
+    prefix: str = "",
+    max_workers: int = UPLOAD_WORKERS,
+    old_prefix: Optional[str] = None,
+) -> List[str]:
+    """Render the site and upload it without going through dist/.
+
+    Pages are rendered in memory and PUT directly; assets are uploaded from
+    the source tree. Takes the same arguments and returns the same keys as
+    ``upload_directory_to_s3``.
+    """
+    # render_pages() forks worker processes, so it must finish before any
+    # upload thread exists: forking a multi-threaded process can deadlock.
+    pages = list(render_pages())
+    files = _walk_files(str(ASSETS_DIR), "assets/") if ASSETS_DIR.exists() else ()
+    return _upload_all(bucket_name, prefix, files, pages, max_workers, old_prefix)
+
+
+def _invalidation_paths(
+    keys: List[str], prefix: str = "", viewer_prefix: str = ""
+) -> List[str]:
+    """Map uploaded keys to the CloudFront viewer paths that serve them.
+
+    CloudFront invalidates viewer paths, not S3 keys: the bucket ``prefix``
+    is replaced by ``viewer_prefix``, which is empty when the distribution's
+    origin path points at the prefix.
+    ``foo/index.html`` is also reachable as ``/foo/``, so both are listed.
+    """
+    items = []
+    for key in keys:
+        if prefix and key.startswith(prefix):
+            key = key[len(prefix) :]
+        path = f"/{viewer_prefix}{key}"
+        items.append(path)
+        if key == "index.html" or key.endswith("/index.html"):
+            items.append(path[: -len("index.html")])
+    if len(items) > MAX_INVALIDATION_PATHS:
+        return ["/*"]
+    return items
+
+
+def invalidate_cloudfront(
+    distribution_id: Optional[str],
+    paths: List[str],
+    prefix: str = "",
+    viewer_prefix: str = "",
+) -> None:
+    """Invalidate the given keys in a single batch if an ID is provided.
+
+    ``prefix`` is the bucket prefix the keys were uploaded under and
+    ``viewer_prefix`` the path CloudFront serves it at (see
+    ``_invalidation_paths``). Falls back to ``/*`` when the change set exceeds
+    CloudFront's per-batch limit, and does nothing when no paths changed.
+    """
+    if not distribution_id or not paths:
         return
+    items = _invalidation_paths(paths, prefix, viewer_prefix)
     cf = boto3.client("cloudfront")
     try:
         resp = cf.create_invalidation(
             DistributionId=distribution_id,
             InvalidationBatch={
-                "Paths": {"Quantity": 1, "Items": ["/*"]},
+                "Paths": {"Quantity": len(items), "Items": items},
                 "CallerReference": f"endodoncia-{os.urandom(8).hex()}",
             },
         )
@@ -56,17 +601,39 @@ def invalidate_cloudfront(distribution_id: Optional[str]) -> None:
 
 
 def main() -> None:
+    parser = argparse.ArgumentParser(description="Deploy the site to S3/CloudFront")
+    parser.add_argument(
+        "--build",
+        action="store_true",
+        help="render pages and upload them directly instead of reading dist/",
+    )
+    args = parser.parse_args()
+
     bucket = os.environ.get("AWS_S3_BUCKET")
     if not bucket:
         raise SystemExit("AWS_S3_BUCKET environment variable is required")
     prefix = os.environ.get("AWS_S3_PREFIX", "")
+    old_prefix = os.environ.get("AWS_S3_OLD_PREFIX")
     distribution_id = os.environ.get("CLOUDFRONT_DIST_ID")
+    # Where the prefix appears in viewer URLs; empty when the distribution's
+    # origin path is the prefix itself.
+    viewer_prefix = os.environ.get("CLOUDFRONT_PATH_PREFIX", "").strip("/")
+    if viewer_prefix:
+        viewer_prefix += "/"
+    try:
+        max_workers = int(os.environ.get("DEPLOY_MAX_WORKERS", UPLOAD_WORKERS))
+    except ValueError:
+        raise SystemExit("DEPLOY_MAX_WORKERS must be an integer")
+    if max_workers < 1:
+        raise SystemExit("DEPLOY_MAX_WORKERS must be at least 1")
 
-    if not DIST_DIR.exists():
-        raise SystemExit("dist/ not found. Run `uv run build-site` first.")
-
-    upload_directory_to_s3(bucket, prefix)
-    invalidate_cloudfront(distribution_id)
+    if args.build:
+        changed = build_and_deploy(bucket, prefix, max_workers, old_prefix)
+    else:
+        if not DIST_DIR.exists():
+            raise SystemExit("dist/ not found. Run `uv run build-site` first.")
+        changed = upload_directory_to_s3(bucket, prefix, max_workers, old_prefix)
+    invalidate_cloudfront(distribution_id, changed, prefix, viewer_prefix)
 
 
 if __name__ == "__main__":